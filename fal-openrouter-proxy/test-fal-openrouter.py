@@ -4,19 +4,29 @@ fal.ai OpenRouter Worker 测试脚本 (Python)
 
 使用方法:
     python test-fal-openrouter.py --url https://your-worker.workers.dev --key your-fal-api-key
+    python test-fal-openrouter.py --url ... --key ... --repeat 50 --concurrency 10  # 压测
 
 依赖:
-    pip install openai requests
+    pip install openai "httpx[http2]"
+    pip install orjson  # 可选，加速 JSON 解析
 """
 
 import argparse
+import asyncio
+import hashlib
+import importlib.util
+import io
 import json
+import os
+import statistics
 import sys
 import time
-from typing import Optional
+from pathlib import Path
+from typing import Optional, TextIO, Tuple
 
 try:
-    from openai import OpenAI
+    from openai import AsyncOpenAI
+    from openai.types.chat import ChatCompletion
     HAS_OPENAI = True
 except ImportError:
     HAS_OPENAI = False
@@ -24,12 +34,32 @@ except ImportError:
     print("安装: pip install openai")
 
 try:
-    import requests
-    HAS_REQUESTS = True
+    import httpx
+    HAS_HTTPX = True
 except ImportError:
-    HAS_REQUESTS = False
-    print("警告: requests 库未安装，部分测试将跳过")
-    print("安装: pip install requests")
+    HAS_HTTPX = False
+    print("警告: httpx 库未安装，部分测试将跳过")
+    print("安装: pip install httpx")
+
+# orjson 解析速度更快，未安装时回退到标准库 json
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# HTTP/2 需要 h2 库，缺失时回退到 HTTP/1.1 keep-alive
+HAS_H2 = importlib.util.find_spec("h2") is not None
+
+# 并发上限，避免瞬时请求过多触发 Worker/上游限流
+MAX_CONCURRENCY = 8
+
+# --cache 时变化很少的模型列表缓存在本地，1 小时过期
+CACHE_DIR = Path.home() / ".cache" / "fal-openrouter-test"
+CACHE_TTL = 3600
+
+# --cache-llm 时固定测试提示词的响应缓存 1 天
+LLM_CACHE_TTL = 86400
 
 
 class Colors:
@@ -41,195 +71,363 @@ class Colors:
     NC = '\033[0m'  # No Color
 
 
-def print_header(text: str):
+# 输出不是终端 (CI 日志、重定向到文件) 时不输出 ANSI 颜色码
+if not sys.stdout.isatty():
+    for _name in ("RED", "GREEN", "YELLOW", "BLUE", "NC"):
+        setattr(Colors, _name, "")
+
+# 预先拼好的分隔线
+HEADER_BAR = f"{Colors.YELLOW}{'='*50}{Colors.NC}"
+BANNER_BAR = f"{Colors.BLUE}{'='*60}{Colors.NC}"
+
+
+def print_header(text: str, file: Optional[TextIO] = None):
     """打印测试标题"""
-    print(f"\n{Colors.YELLOW}{'='*50}{Colors.NC}")
-    print(f"{Colors.YELLOW}{text}{Colors.NC}")
-    print(f"{Colors.YELLOW}{'='*50}{Colors.NC}")
+    print(f"\n{HEADER_BAR}\n{Colors.YELLOW}{text}{Colors.NC}\n{HEADER_BAR}", file=file)
 
 
-def print_success(text: str):
+def print_success(text: str, file: Optional[TextIO] = None):
     """打印成功信息"""
-    print(f"{Colors.GREEN}✓ {text}{Colors.NC}")
+    print(f"{Colors.GREEN}✓ {text}{Colors.NC}", file=file)
 
 
-def print_error(text: str):
+def print_error(text: str, file: Optional[TextIO] = None):
     """打印错误信息"""
-    print(f"{Colors.RED}✗ {text}{Colors.NC}")
+    print(f"{Colors.RED}✗ {text}{Colors.NC}", file=file)
 
 
-def print_info(text: str):
+def print_info(text: str, file: Optional[TextIO] = None):
     """打印信息"""
-    print(f"{Colors.BLUE}ℹ {text}{Colors.NC}")
+    print(f"{Colors.BLUE}ℹ {text}{Colors.NC}", file=file)
+
+
+# 可选依赖是否可用，供 @requires 过滤测试
+CAPABILITIES = {
+    "openai": HAS_OPENAI,
+    "httpx": HAS_HTTPX,
+}
+
+
+def requires(capability: str):
+    """标记测试依赖的可选库，缺失时由 run_all_tests 统一跳过"""
+    def decorator(func):
+        func.requires = capability
+        return func
+    return decorator
+
+
+async def _bounded(sem: asyncio.Semaphore, test, quiet: bool = False):
+    """在信号量限制下执行单个测试，输出先缓冲再一次性写出，避免并发时日志交错
+
+    quiet 为 True 时只输出失败测试的日志。
+    """
+    buf = io.StringIO()
+    ok = False
+    try:
+        async with sem:
+            ok = await test(buf)
+            return ok
+    finally:
+        if not (quiet and ok):
+            sys.stdout.write(buf.getvalue())
+            sys.stdout.flush()
 
 
 class WorkerTester:
     """Worker 测试类"""
     
-    def __init__(self, base_url: str, api_key: str):
+    def __init__(self, base_url: str, api_key: str, use_cache: bool = False, full: bool = False,
+                 cache_llm: bool = False):
         self.base_url = base_url.rstrip('/')
         self.api_key = api_key
+        self.use_cache = use_cache
+        self.full = full
+        self.cache_llm = cache_llm
         self.passed = 0
         self.failed = 0
+        self.latencies = []  # test_chat_non_stream 每次成功请求的耗时，供压测统计
+        
+        if HAS_HTTPX:
+            # 所有测试共享一个连接池，复用 TCP/TLS 连接；认证头在客户端级别统一设置
+            self.http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {api_key}"},
+                http2=HAS_H2,
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+                timeout=30.0
+            )
         
         if HAS_OPENAI:
-            self.client = OpenAI(
+            self.client = AsyncOpenAI(
                 base_url=f"{self.base_url}/v1",
-                api_key=api_key
+                api_key=api_key,
+                http_client=self.http
             )
     
-    def test_root(self) -> bool:
-        """测试根路径"""
-        print_header("测试 1: 根路径 (/)")
+    async def aclose(self):
+        """关闭共享的 HTTP 连接池"""
+        if HAS_HTTPX:
+            await self.http.aclose()
+    
+    async def _warm_up(self):
+        """先用一次 /health 预热 DNS 和 TLS 会话，避免并发时每个请求各自握手"""
+        if not HAS_HTTPX:
+            return
+        try:
+            await self.http.get("/health")
+        except httpx.HTTPError:
+            pass  # 连接问题交由具体测试报告
+    
+    def _cache_read(self, key: str, ttl: int) -> Optional[dict]:
+        """读取未过期的本地缓存条目，不存在或已过期时返回 None"""
+        try:
+            entry = json_loads((CACHE_DIR / f"{key}.json").read_bytes())
+            if time.time() - entry["ts"] < ttl:
+                return entry["body"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return None
+    
+    def _cache_write(self, key: str, body: dict):
+        """写入本地缓存条目 (先写临时文件再替换，避免并发读到半截内容)"""
+        cache_file = CACHE_DIR / f"{key}.json"
+        try:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            tmp_file = cache_file.with_suffix(".tmp")
+            tmp_file.write_text(json.dumps({"ts": time.time(), "body": body}), encoding="utf-8")
+            os.replace(tmp_file, cache_file)
+        except OSError:
+            pass
+    
+    async def cached_get(self, path: str, ttl: int = CACHE_TTL) -> Tuple[int, Optional[dict], bool]:
+        """带本地磁盘缓存的 GET 请求，返回 (状态码, JSON 数据, 是否命中缓存)"""
+        key = hashlib.sha256(f"{self.base_url}\n{path}".encode()).hexdigest()
         
-        if not HAS_REQUESTS:
-            print_info("跳过 (需要 requests 库)")
-            return True
+        if self.use_cache:
+            data = self._cache_read(key, ttl)
+            if data is not None:
+                return 200, data, True
+        
+        response = await self.http.get(path)
+        if response.status_code != 200:
+            return response.status_code, None, False
+        
+        data = json_loads(response.content)
+        if self.use_cache:
+            self._cache_write(key, data)
+        return 200, data, False
+    
+    async def cached_create(self, **kwargs) -> Tuple["ChatCompletion", bool]:
+        """带本地缓存的非流式 Chat Completions，返回 (响应, 是否命中缓存)
+        
+        仅在 --cache-llm 时启用；流式请求和 temperature > 0 的请求结果不可复现，始终直连。
+        """
+        if not self.cache_llm or kwargs.get("stream") or (kwargs.get("temperature") or 0) > 0:
+            return await self.client.chat.completions.create(**kwargs), False
+        
+        key = hashlib.blake2b(json.dumps({
+            "base_url": self.base_url,
+            # 不同 (或已吊销) 的密钥不能复用缓存，只存密钥哈希
+            "api_key": hashlib.sha256(self.api_key.encode()).hexdigest(),
+            "model": kwargs.get("model"),
+            "messages": kwargs.get("messages"),
+            "temperature": kwargs.get("temperature"),
+            "max_tokens": kwargs.get("max_tokens"),
+        }, sort_keys=True).encode()).hexdigest()
+        
+        body = self._cache_read(key, LLM_CACHE_TTL)
+        if body is not None:
+            return ChatCompletion.model_validate(body), True
+        
+        response = await self.client.chat.completions.create(**kwargs)
+        self._cache_write(key, response.model_dump(mode="json"))
+        return response, False
+    
+    @requires("httpx")
+    async def test_root(self, out: TextIO) -> bool:
+        """测试根路径"""
+        print_header("测试 1: 根路径 (/)", file=out)
         
         try:
-            response = requests.get(f"{self.base_url}/")
+            response = await self.http.get("/")
             if response.status_code == 200:
-                data = response.json()
-                print_success("根路径返回 API 信息")
-                print(f"  名称: {data.get('name', 'N/A')}")
-                print(f"  版本: {data.get('version', 'N/A')}")
+                data = json_loads(response.content)
+                print_success("根路径返回 API 信息", file=out)
+                print(f"  名称: {data.get('name', 'N/A')}", file=out)
+                print(f"  版本: {data.get('version', 'N/A')}", file=out)
                 return True
             else:
-                print_error(f"状态码: {response.status_code}")
+                print_error(f"状态码: {response.status_code}", file=out)
                 return False
         except Exception as e:
-            print_error(f"请求失败: {e}")
+            print_error(f"请求失败: {e}", file=out)
             return False
     
-    def test_health(self) -> bool:
+    @requires("httpx")
+    async def test_health(self, out: TextIO) -> bool:
         """测试健康检查"""
-        print_header("测试 2: 健康检查 (/health)")
-        
-        if not HAS_REQUESTS:
-            print_info("跳过 (需要 requests 库)")
-            return True
+        print_header("测试 2: 健康检查 (/health)", file=out)
         
         try:
-            response = requests.get(f"{self.base_url}/health")
+            response = await self.http.get("/health")
             if response.status_code == 200:
-                data = response.json()
-                print_success("健康检查通过")
-                print(f"  状态: {data.get('status', 'N/A')}")
-                print(f"  时间: {data.get('timestamp', 'N/A')}")
+                data = json_loads(response.content)
+                print_success("健康检查通过", file=out)
+                print(f"  状态: {data.get('status', 'N/A')}", file=out)
+                print(f"  时间: {data.get('timestamp', 'N/A')}", file=out)
                 return True
             else:
-                print_error(f"状态码: {response.status_code}")
+                print_error(f"状态码: {response.status_code}", file=out)
                 return False
         except Exception as e:
-            print_error(f"请求失败: {e}")
+            print_error(f"请求失败: {e}", file=out)
             return False
     
-    def test_models(self) -> bool:
+    @requires("httpx")
+    async def test_models(self, out: TextIO) -> bool:
         """测试模型列表"""
-        print_header("测试 3: 模型列表 (/v1/models)")
-        
-        if not HAS_REQUESTS:
-            print_info("跳过 (需要 requests 库)")
-            return True
+        print_header("测试 3: 模型列表 (/v1/models)", file=out)
         
         try:
-            response = requests.get(
-                f"{self.base_url}/v1/models",
-                headers={"Authorization": f"Bearer {self.api_key}"}
-            )
-            if response.status_code == 200:
-                data = response.json()
+            status, data, cached = await self.cached_get("/v1/models")
+            if status == 200:
                 models = data.get('data', [])
-                print_success(f"获取到 {len(models)} 个模型")
+                print_success(f"获取到 {len(models)} 个模型{' (本地缓存)' if cached else ''}", file=out)
                 for model in models[:5]:
-                    print(f"  - {model.get('id', 'N/A')}")
+                    print(f"  - {model.get('id', 'N/A')}", file=out)
                 if len(models) > 5:
-                    print(f"  ... 还有 {len(models) - 5} 个模型")
+                    print(f"  ... 还有 {len(models) - 5} 个模型", file=out)
                 return True
             else:
-                print_error(f"状态码: {response.status_code}")
+                print_error(f"状态码: {status}", file=out)
                 return False
         except Exception as e:
-            print_error(f"请求失败: {e}")
+            print_error(f"请求失败: {e}", file=out)
             return False
     
-    def test_chat_non_stream(self) -> bool:
-        """测试非流式 Chat Completions"""
-        print_header("测试 4: 非流式 Chat Completions")
+    @requires("openai")
+    async def test_chat_non_stream(self, out: TextIO) -> bool:
+        """测试 Chat Completions (默认只测首 token 延迟，--full 时完整非流式请求)"""
+        if self.full:
+            print_header("测试 4: 非流式 Chat Completions", file=out)
+        else:
+            print_header("测试 4: Chat Completions 首 token 延迟", file=out)
         
-        if not HAS_OPENAI:
-            print_info("跳过 (需要 openai 库)")
-            return True
+        messages = [
+            {"role": "user", "content": "Say 'Hello World' and nothing else."}
+        ]
         
         try:
-            start_time = time.time()
-            response = self.client.chat.completions.create(
+            if self.full:
+                t0 = time.perf_counter()
+                response, cached = await self.cached_create(
+                    model="google/gemini-2.5-flash",
+                    messages=messages,
+                    max_tokens=20
+                )
+                elapsed = time.perf_counter() - t0
+                
+                self.latencies.append(elapsed)
+                content = response.choices[0].message.content
+                print_success(f"非流式请求成功 ({elapsed:.2f}s){' (本地缓存)' if cached else ''}", file=out)
+                print(f"  模型: {response.model}", file=out)
+                print(f"  响应: {content[:100]}{'...' if len(content) > 100 else ''}", file=out)
+                if response.usage:
+                    print(f"  用量: {response.usage.prompt_tokens}+{response.usage.completion_tokens}={response.usage.total_tokens} tokens", file=out)
+                return True
+            
+            # 冒烟测试只关心请求链路是否通畅，拿到预期内容后立即断开，不等待完整解码
+            t0 = time.perf_counter()
+            stream = await self.client.chat.completions.create(
                 model="google/gemini-2.5-flash",
-                messages=[
-                    {"role": "user", "content": "Say 'Hello World' and nothing else."}
-                ],
+                messages=messages,
+                stream=True,
                 max_tokens=20
             )
-            elapsed = time.time() - start_time
+            first_token_time = None
+            content = ""
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if first_token_time is None:
+                            first_token_time = time.perf_counter() - t0
+                        content += chunk.choices[0].delta.content
+                        if "hello world" in content.lower():
+                            break
+            finally:
+                await stream.close()
+            elapsed = time.perf_counter() - t0
             
-            content = response.choices[0].message.content
-            print_success(f"非流式请求成功 ({elapsed:.2f}s)")
-            print(f"  模型: {response.model}")
-            print(f"  响应: {content[:100]}{'...' if len(content) > 100 else ''}")
-            if response.usage:
-                print(f"  用量: {response.usage.prompt_tokens}+{response.usage.completion_tokens}={response.usage.total_tokens} tokens")
+            if first_token_time is None:
+                print_error("未收到任何响应内容", file=out)
+                return False
+            self.latencies.append(elapsed)
+            print_success(f"首 token 延迟 {first_token_time:.2f}s (总耗时 {elapsed:.2f}s)", file=out)
+            print(f"  响应: {content[:100]}{'...' if len(content) > 100 else ''}", file=out)
             return True
         except Exception as e:
-            print_error(f"请求失败: {e}")
+            print_error(f"请求失败: {e}", file=out)
             return False
     
-    def test_chat_stream(self) -> bool:
+    @requires("httpx")
+    async def test_chat_stream(self, out: TextIO) -> bool:
         """测试流式 Chat Completions"""
-        print_header("测试 5: 流式 Chat Completions")
-        
-        if not HAS_OPENAI:
-            print_info("跳过 (需要 openai 库)")
-            return True
+        print_header("测试 5: 流式 Chat Completions", file=out)
         
         try:
-            start_time = time.time()
-            stream = self.client.chat.completions.create(
-                model="google/gemini-2.5-flash",
-                messages=[
-                    {"role": "user", "content": "Count from 1 to 5."}
-                ],
-                stream=True,
-                max_tokens=50
-            )
-            
-            print("  响应: ", end="", flush=True)
-            chunk_count = 0
-            full_content = ""
-            for chunk in stream:
-                chunk_count += 1
-                if chunk.choices[0].delta.content:
-                    content = chunk.choices[0].delta.content
-                    full_content += content
-                    print(content, end="", flush=True)
-            print()
+            t0 = time.perf_counter()
+            # 直接解析 SSE 行，只取 delta.content，绕过 SDK 对每个 chunk 的模型校验
+            async with self.http.stream(
+                "POST",
+                "/v1/chat/completions",
+                json={
+                    "model": "google/gemini-2.5-flash",
+                    "messages": [
+                        {"role": "user", "content": "Count from 1 to 5."}
+                    ],
+                    "stream": True,
+                    "max_tokens": 50
+                }
+            ) as response:
+                if response.status_code != 200:
+                    print_error(f"状态码: {response.status_code}", file=out)
+                    return False
+                
+                print("  响应: ", end="", file=out)
+                chunk_count = 0
+                full_content = ""
+                async for line in response.aiter_lines():
+                    # SSE 规范中 "data:" 后的空格可省略
+                    if not line.startswith("data:"):
+                        continue
+                    payload = line[5:].lstrip()
+                    if payload == "[DONE]":
+                        break
+                    chunk_count += 1
+                    choices = json_loads(payload).get("choices")
+                    content = (choices[0].get("delta") or {}).get("content") if choices else None
+                    if content:
+                        full_content += content
+                        print(content, end="", file=out)
+                print(file=out)
             
-            elapsed = time.time() - start_time
-            print_success(f"流式请求成功 ({elapsed:.2f}s, {chunk_count} chunks)")
+            if not full_content:
+                print_error(f"未收到任何响应内容 ({chunk_count} chunks)", file=out)
+                return False
+            elapsed = time.perf_counter() - t0
+            print_success(f"流式请求成功 ({elapsed:.2f}s, {chunk_count} chunks)", file=out)
             return True
         except Exception as e:
-            print_error(f"请求失败: {e}")
+            print_error(f"请求失败: {e}", file=out)
             return False
     
-    def test_system_message(self) -> bool:
+    @requires("openai")
+    async def test_system_message(self, out: TextIO) -> bool:
         """测试系统消息"""
-        print_header("测试 6: 带系统消息的对话")
-        
-        if not HAS_OPENAI:
-            print_info("跳过 (需要 openai 库)")
-            return True
+        print_header("测试 6: 带系统消息的对话", file=out)
         
         try:
-            response = self.client.chat.completions.create(
+            response, cached = await self.cached_create(
                 model="google/gemini-2.5-flash",
                 messages=[
                     {"role": "system", "content": "You are a helpful assistant that speaks like a pirate."},
@@ -239,23 +437,20 @@ class WorkerTester:
             )
             
             content = response.choices[0].message.content
-            print_success("系统消息测试成功")
-            print(f"  响应: {content[:150]}{'...' if len(content) > 150 else ''}")
+            print_success(f"系统消息测试成功{' (本地缓存)' if cached else ''}", file=out)
+            print(f"  响应: {content[:150]}{'...' if len(content) > 150 else ''}", file=out)
             return True
         except Exception as e:
-            print_error(f"请求失败: {e}")
+            print_error(f"请求失败: {e}", file=out)
             return False
     
-    def test_multi_turn(self) -> bool:
+    @requires("openai")
+    async def test_multi_turn(self, out: TextIO) -> bool:
         """测试多轮对话"""
-        print_header("测试 7: 多轮对话")
-        
-        if not HAS_OPENAI:
-            print_info("跳过 (需要 openai 库)")
-            return True
+        print_header("测试 7: 多轮对话", file=out)
         
         try:
-            response = self.client.chat.completions.create(
+            response, cached = await self.cached_create(
                 model="google/gemini-2.5-flash",
                 messages=[
                     {"role": "user", "content": "My name is Alice."},
@@ -266,82 +461,81 @@ class WorkerTester:
             )
             
             content = response.choices[0].message.content.lower()
+            suffix = " (本地缓存)" if cached else ""
             if "alice" in content:
-                print_success("多轮对话测试成功 - 模型记住了名字")
+                print_success(f"多轮对话测试成功 - 模型记住了名字{suffix}", file=out)
             else:
-                print_success("多轮对话测试完成 (模型可能未记住名字)")
-            print(f"  响应: {response.choices[0].message.content}")
+                print_success(f"多轮对话测试完成 (模型可能未记住名字){suffix}", file=out)
+            print(f"  响应: {response.choices[0].message.content}", file=out)
             return True
         except Exception as e:
-            print_error(f"请求失败: {e}")
+            print_error(f"请求失败: {e}", file=out)
             return False
     
-    def test_error_no_auth(self) -> bool:
+    @requires("httpx")
+    async def test_error_no_auth(self, out: TextIO) -> bool:
         """测试错误处理 - 缺少认证"""
-        print_header("测试 8: 错误处理 - 缺少认证")
-        
-        if not HAS_REQUESTS:
-            print_info("跳过 (需要 requests 库)")
-            return True
+        print_header("测试 8: 错误处理 - 缺少认证", file=out)
         
         try:
-            response = requests.post(
-                f"{self.base_url}/v1/chat/completions",
-                headers={"Content-Type": "application/json"},
+            request = self.http.build_request(
+                "POST",
+                "/v1/chat/completions",
                 json={
                     "model": "google/gemini-2.5-flash",
                     "messages": [{"role": "user", "content": "Hello"}]
                 }
             )
+            # 去掉客户端级别的认证头
+            del request.headers["Authorization"]
+            # 只检查状态码，以流式方式发送后直接关闭，不下载错误响应体
+            response = await self.http.send(request, stream=True)
+            try:
+                status = response.status_code
+            finally:
+                await response.aclose()
             
-            if response.status_code == 401:
-                print_success("正确返回 401 错误")
+            if status == 401:
+                print_success("正确返回 401 错误", file=out)
                 return True
             else:
-                print_error(f"预期 401，实际 {response.status_code}")
+                print_error(f"预期 401，实际 {status}", file=out)
                 return False
         except Exception as e:
-            print_error(f"请求失败: {e}")
+            print_error(f"请求失败: {e}", file=out)
             return False
     
-    def test_error_invalid_json(self) -> bool:
+    @requires("httpx")
+    async def test_error_invalid_json(self, out: TextIO) -> bool:
         """测试错误处理 - 无效 JSON"""
-        print_header("测试 9: 错误处理 - 无效 JSON")
-        
-        if not HAS_REQUESTS:
-            print_info("跳过 (需要 requests 库)")
-            return True
+        print_header("测试 9: 错误处理 - 无效 JSON", file=out)
         
         try:
-            response = requests.post(
-                f"{self.base_url}/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                },
-                data="invalid json"
-            )
+            async with self.http.stream(
+                "POST",
+                "/v1/chat/completions",
+                headers={"Content-Type": "application/json"},
+                content="invalid json"
+            ) as response:
+                status = response.status_code
             
-            if response.status_code == 400:
-                print_success("正确返回 400 错误")
+            if status == 400:
+                print_success("正确返回 400 错误", file=out)
                 return True
             else:
-                print_error(f"预期 400，实际 {response.status_code}")
+                print_error(f"预期 400，实际 {status}", file=out)
                 return False
         except Exception as e:
-            print_error(f"请求失败: {e}")
+            print_error(f"请求失败: {e}", file=out)
             return False
     
-    def test_temperature(self) -> bool:
+    @requires("openai")
+    async def test_temperature(self, out: TextIO) -> bool:
         """测试温度参数"""
-        print_header("测试 10: 温度参数")
-        
-        if not HAS_OPENAI:
-            print_info("跳过 (需要 openai 库)")
-            return True
+        print_header("测试 10: 温度参数", file=out)
         
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model="google/gemini-2.5-flash",
                 messages=[
                     {"role": "user", "content": "Give me a random word."}
@@ -350,22 +544,22 @@ class WorkerTester:
                 max_tokens=20
             )
             
-            print_success("温度参数测试成功")
-            print(f"  响应: {response.choices[0].message.content}")
+            print_success("温度参数测试成功", file=out)
+            print(f"  响应: {response.choices[0].message.content}", file=out)
             return True
         except Exception as e:
-            print_error(f"请求失败: {e}")
+            print_error(f"请求失败: {e}", file=out)
             return False
     
-    def run_all_tests(self):
+    async def run_all_tests(self):
         """运行所有测试"""
-        print(f"\n{Colors.BLUE}{'='*60}{Colors.NC}")
+        print(f"\n{BANNER_BAR}")
         print(f"{Colors.BLUE}  fal.ai OpenRouter Worker 测试{Colors.NC}")
-        print(f"{Colors.BLUE}{'='*60}{Colors.NC}")
+        print(BANNER_BAR)
         print(f"  Worker URL: {Colors.YELLOW}{self.base_url}{Colors.NC}")
         print(f"  API Key: {Colors.YELLOW}{self.api_key[:10]}...{Colors.NC}")
         
-        tests = [
+        candidate_tests = [
             self.test_root,
             self.test_health,
             self.test_models,
@@ -377,21 +571,35 @@ class WorkerTester:
             self.test_error_invalid_json,
             self.test_temperature,
         ]
+        tests = [t for t in candidate_tests if CAPABILITIES[t.requires]]
+        if len(tests) < len(candidate_tests):
+            print_info(f"跳过 {len(candidate_tests) - len(tests)} 个测试 (缺少依赖库)")
         
-        for test in tests:
-            try:
-                if test():
-                    self.passed += 1
-                else:
-                    self.failed += 1
-            except Exception as e:
-                print_error(f"测试异常: {e}")
+        # 各测试互不依赖（含 5 个 LLM 请求），并发执行以重叠网络等待。
+        # LLM 测试的提示词各不相同，无法用 n>1 合并为一次请求 (OpenRouter 也不支持 n)；
+        # 它们共享同一个 AsyncOpenAI 和连接池，启用 HTTP/2 时复用同一条连接
+        sem = asyncio.Semaphore(MAX_CONCURRENCY)
+        try:
+            await self._warm_up()
+            results = await asyncio.gather(
+                *[_bounded(sem, test) for test in tests],
+                return_exceptions=True
+            )
+        finally:
+            await self.aclose()
+        for result in results:
+            if isinstance(result, BaseException):
+                print_error(f"测试异常: {result}")
+                self.failed += 1
+            elif result:
+                self.passed += 1
+            else:
                 self.failed += 1
         
         # 打印总结
-        print(f"\n{Colors.BLUE}{'='*60}{Colors.NC}")
+        print(f"\n{BANNER_BAR}")
         print(f"{Colors.BLUE}  测试完成{Colors.NC}")
-        print(f"{Colors.BLUE}{'='*60}{Colors.NC}")
+        print(BANNER_BAR)
         print(f"  {Colors.GREEN}通过: {self.passed}{Colors.NC}")
         print(f"  {Colors.RED}失败: {self.failed}{Colors.NC}")
         print(f"  总计: {self.passed + self.failed}")
@@ -402,6 +610,62 @@ class WorkerTester:
             print(f"\n{Colors.YELLOW}⚠️  部分测试失败，请检查配置。{Colors.NC}")
         
         return self.failed == 0
+    
+    async def run_load_test(self, repeat: int, concurrency: int):
+        """压测模式：以指定并发重复执行 test_chat_non_stream，统计延迟分位数和吞吐量"""
+        print(f"\n{BANNER_BAR}")
+        print(f"{Colors.BLUE}  fal.ai OpenRouter Worker 压测{Colors.NC}")
+        print(BANNER_BAR)
+        print(f"  Worker URL: {Colors.YELLOW}{self.base_url}{Colors.NC}")
+        print(f"  请求数: {Colors.YELLOW}{repeat}{Colors.NC}  并发: {Colors.YELLOW}{concurrency}{Colors.NC}")
+        
+        if not CAPABILITIES[self.test_chat_non_stream.requires]:
+            print_error("压测需要 openai 库")
+            return False
+        
+        # 压测必须真正请求 Worker，缓存命中会虚高吞吐量
+        if self.cache_llm:
+            print_info("压测模式下忽略 --cache-llm")
+            self.cache_llm = False
+        
+        sem = asyncio.Semaphore(concurrency)
+        try:
+            await self._warm_up()
+            t0 = time.perf_counter()
+            results = await asyncio.gather(
+                *[_bounded(sem, self.test_chat_non_stream, quiet=True) for _ in range(repeat)],
+                return_exceptions=True
+            )
+            wall = time.perf_counter() - t0
+        finally:
+            await self.aclose()
+        for result in results:
+            if isinstance(result, BaseException):
+                print_error(f"测试异常: {result}")
+                self.failed += 1
+            elif result:
+                self.passed += 1
+            else:
+                self.failed += 1
+        
+        # 打印统计
+        print(f"\n{BANNER_BAR}")
+        print(f"{Colors.BLUE}  压测完成{Colors.NC}")
+        print(BANNER_BAR)
+        print(f"  {Colors.GREEN}成功: {self.passed}{Colors.NC}")
+        print(f"  {Colors.RED}失败: {self.failed}{Colors.NC}")
+        print(f"  总耗时: {wall:.2f}s")
+        print(f"  吞吐量: {self.passed / wall:.2f} req/s")
+        if self.latencies:
+            if len(self.latencies) > 1:
+                p95 = statistics.quantiles(self.latencies, n=100, method="inclusive")[94]
+            else:
+                p95 = self.latencies[0]
+            print(f"  延迟 p50: {statistics.median(self.latencies):.2f}s")
+            print(f"  延迟 p95: {p95:.2f}s")
+            print(f"  延迟 max: {max(self.latencies):.2f}s")
+        
+        return self.failed == 0
 
 
 def main():
@@ -418,11 +682,45 @@ def main():
         default="your-fal-api-key",
         help="fal.ai API 密钥"
     )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="缓存 /v1/models 响应 (1 小时)，命中缓存时不再请求 Worker"
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="完整执行非流式请求 (默认只测量首 token 延迟)"
+    )
+    parser.add_argument(
+        "--cache-llm",
+        action="store_true",
+        help="缓存固定提示词的非流式 LLM 响应，重复运行时不再消耗 tokens"
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        help="压测模式：重复执行 Chat Completions 测试的次数 (默认: 1)"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        help="压测模式下的并发数 (默认: 1)"
+    )
     
     args = parser.parse_args()
+    for name in ("repeat", "concurrency"):
+        value = getattr(args, name)
+        if value is not None and value < 1:
+            parser.error(f"--{name} 必须大于等于 1")
     
-    tester = WorkerTester(args.url, args.key)
-    success = tester.run_all_tests()
+    tester = WorkerTester(args.url, args.key, use_cache=args.cache, full=args.full,
+                          cache_llm=args.cache_llm)
+    # 显式指定 --repeat 或 --concurrency 时进入压测模式
+    if args.repeat is not None or args.concurrency is not None:
+        success = asyncio.run(tester.run_load_test(args.repeat or 1, args.concurrency or 1))
+    else:
+        success = asyncio.run(tester.run_all_tests())
     
     sys.exit(0 if success else 1)
 